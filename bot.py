@@ -14,12 +14,22 @@ Features:
 
 import os
 import json
+import asyncio
+import functools
 import logging
+import random
+import threading
+from collections import Counter
 from datetime import datetime, time, timedelta
+from time import monotonic, sleep
+from zoneinfo import ZoneInfo
 from dotenv import load_dotenv
 
 import gspread
+from gspread.utils import a1_range_to_grid_range, fill_gaps, get_a1_from_absolute_range
+from google.auth.exceptions import RefreshError
 from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
 
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand, BotCommandScopeChat
 from telegram.ext import (
@@ -49,6 +59,21 @@ ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID", "").strip()  # Optional: Get notified
 if not ADMIN_CHAT_ID:
     ADMIN_CHAT_ID = None
 
+# Optional: public HTTPS URL of this bot (e.g. https://my-bot.herokuapp.com) to receive
+# updates via webhook instead of long polling. Telegram posts to WEBHOOK_URL/<token>.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").strip().rstrip("/")
+
+PORT = int(os.getenv("PORT", "8443"))
+
+# Timezone of the Monday morning weekly summary, also used for timestamps until the
+# spreadsheet's own timezone is known (should match the spreadsheet's timezone)
+WEEKLY_SUMMARY_TIMEZONE = os.getenv("WEEKLY_SUMMARY_TIMEZONE", "").strip() or "Europe/Berlin"
+try:
+    WEEKLY_SUMMARY_TIMEZONE = ZoneInfo(WEEKLY_SUMMARY_TIMEZONE)
+except (KeyError, ValueError) as e:
+    logger.warning(f"Unknown WEEKLY_SUMMARY_TIMEZONE {WEEKLY_SUMMARY_TIMEZONE!r}, using Europe/Berlin: {e}")
+    WEEKLY_SUMMARY_TIMEZONE = ZoneInfo("Europe/Berlin")
+
 # Google Sheets
 GOOGLE_SHEET_ID = "1nb7A0nCucAwz2ylBrIl65OQ5J3LgbqHErS5nkrK2rH0"
 
@@ -62,272 +87,619 @@ KOSTENSTELLE_OPTIONS = [
     ["Andere"]
 ]
 
+# Keyboards shown during the order conversation
+DRINGLICHKEIT_MARKUP = ReplyKeyboardMarkup(DRINGLICHKEIT_OPTIONS, one_time_keyboard=True, resize_keyboard=True)
+KOSTENSTELLE_MARKUP = ReplyKeyboardMarkup(KOSTENSTELLE_OPTIONS, one_time_keyboard=True, resize_keyboard=True)
+CONFIRMATION_MARKUP = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ Bestätigen & Absenden", callback_data="confirm_yes")],
+    [InlineKeyboardButton("✏️ Nochmal von vorne", callback_data="confirm_restart")],
+    [InlineKeyboardButton("❌ Abbrechen", callback_data="confirm_cancel")]
+])
+
+# The only update types the handlers below react to
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
 # Conversation states
 ARTIKEL, MENGE, DRINGLICHKEIT, KOSTENSTELLE, FOTO, BESTAETIGUNG, STORNO_AUSWAHL = range(7)
 
+# Message templates (plain text, so user input can't break Markdown parsing)
+ORDER_SAVED_TMPL = (
+    "✅ Bestellanfrage {order_number} erfasst!\n\n"
+    "📦 Artikel: {artikel}\n"
+    "🔢 Menge: {menge}\n"
+    "⏰ Dringlichkeit: {dringlichkeit}\n"
+    "💰 Kostenstelle: {kostenstelle}{foto_text}\n\n"
+    "Du wirst benachrichtigt, wenn bestellt wurde.\n\n"
+    "📋 /meine_bestellungen - Deine offenen Bestellungen\n"
+    "🆕 /start - Neue Anfrage"
+)
+ADMIN_NEW_ORDER_TMPL = (
+    "🆕 Neue Bestellung {order_number}\n\n"
+    "👤 Von: {mitarbeiter}\n"
+    "📦 Artikel: {artikel}\n"
+    "🔢 Menge: {menge}\n"
+    "⏰ Dringlichkeit: {dringlichkeit}\n"
+    "💰 Kostenstelle: {kostenstelle}"
+)
+ADMIN_NEW_ORDER_PHOTO_TMPL = "📸 Foto für Bestellung {order_number}"
+ORDER_CANCELLED_TMPL = (
+    "✅ Bestellung {order_number} wurde storniert.\n\n"
+    "📦 {artikel} x {menge}\n\n"
+    "/meine_bestellungen - Offene Bestellungen\n"
+    "/start - Neue Bestellung"
+)
+ADMIN_ORDER_CANCELLED_TMPL = (
+    "🗑️ Bestellung {order_number} STORNIERT\n\n"
+    "👤 Von: {first_name}\n"
+    "📦 Artikel: {artikel}\n"
+    "🔢 Menge: {menge}"
+)
+
 
 # ============== Google Sheets Functions ==============
 
-def get_google_sheet():
-    """Connect to Google Sheets using service account."""
+def run_in_thread(func):
+    """Run a blocking Sheets function in a worker thread so it doesn't stall the bot."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+    
+    return wrapper
+
+
+# At most this many Sheets API requests run at once, to stay below the API quota.
+# Only held during the request itself, not during retry backoff or mirror reads.
+SHEETS_MAX_CONCURRENCY = 4
+_SHEETS_SEMAPHORE = threading.BoundedSemaphore(SHEETS_MAX_CONCURRENCY)
+
+# Sheets API errors worth retrying: rate limit and transient server errors
+SHEETS_RETRY_STATUS_CODES = {429, 500, 502, 503}
+SHEETS_MAX_TRIES = 5
+
+
+def with_retry(func, *args, retry_status_codes=SHEETS_RETRY_STATUS_CODES, **kwargs):
+    """Call a gspread method, retrying with exponential backoff on rate limits and server errors.
+
+    Pass retry_status_codes={429} for calls that aren't idempotent: a 5xx may
+    arrive after the request was already applied.
+    """
+    for attempt in range(SHEETS_MAX_TRIES):
+        try:
+            with _SHEETS_SEMAPHORE:
+                return func(*args, **kwargs)
+        except gspread.exceptions.APIError as e:
+            status = e.response.status_code
+            if status not in retry_status_codes or attempt == SHEETS_MAX_TRIES - 1:
+                raise
+            
+            delay = min(2 ** attempt + random.random(), 30)
+            logger.warning(f"Sheets API returned {status}, retrying in {delay:.1f}s")
+            sleep(delay)
+
+
+GOOGLE_SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive"
+]
+
+
+def load_google_credentials():
+    """Load the service account credentials once at startup."""
     try:
-        scopes = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        
         # Try environment variable first (for cloud deployment)
         google_creds_json = os.getenv("GOOGLE_CREDENTIALS_JSON")
         if google_creds_json:
             creds_dict = json.loads(google_creds_json)
-            credentials = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-        else:
-            # Fall back to file (for local development)
-            credentials = Credentials.from_service_account_file("credentials.json", scopes=scopes)
-        
-        client = gspread.authorize(credentials)
-        spreadsheet = client.open_by_key(GOOGLE_SHEET_ID)
-        worksheet = spreadsheet.sheet1
+            return Credentials.from_service_account_info(creds_dict, scopes=GOOGLE_SCOPES)
         
-        return worksheet
+        # Fall back to file (for local development)
+        return Credentials.from_service_account_file("credentials.json", scopes=GOOGLE_SCOPES)
     except Exception as e:
-        logger.error(f"Error connecting to Google Sheets: {type(e).__name__}: {e}")
+        logger.error(f"Error loading Google credentials: {type(e).__name__}: {e}")
         return None
 
 
-def get_next_order_number() -> str:
-    """Get the next order number based on existing rows."""
-    try:
+_CREDENTIALS = load_google_credentials()
+
+# Cached client and worksheet handle, shared by all Sheets functions
+_CLIENT = None
+_WORKSHEET = None
+_SHEET_TIMEZONE = WEEKLY_SUMMARY_TIMEZONE  # Timezone of the spreadsheet, see sheet_now()
+_WORKSHEET_LOCK = threading.Lock()
+
+
+def get_google_sheet():
+    """Connect to Google Sheets using service account.
+
+    The worksheet is cached after the first successful connection, so later
+    calls reuse the same authorized session instead of re-authenticating.
+    The client (and its HTTP connection pool) outlives a reset of the worksheet.
+    """
+    global _CLIENT, _WORKSHEET, _SHEET_TIMEZONE
+    if _WORKSHEET is not None:
+        return _WORKSHEET
+    
+    with _WORKSHEET_LOCK:
+        if _WORKSHEET is not None:
+            return _WORKSHEET
+        
+        if _CREDENTIALS is None:
+            logger.error("Error connecting to Google Sheets: no credentials loaded")
+            return None
+        
+        try:
+            if _CLIENT is None:
+                client = gspread.authorize(_CREDENTIALS)
+                # Keep connections to the Sheets API alive for concurrent handlers
+                client.http_client.session.mount(
+                    "https://", HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                )
+                _CLIENT = client
+            
+            spreadsheet = with_retry(_CLIENT.open_by_key, GOOGLE_SHEET_ID)
+            _WORKSHEET = with_retry(spreadsheet.get_worksheet, 0)
+            
+            try:
+                _SHEET_TIMEZONE = ZoneInfo(spreadsheet.timezone)
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Unknown spreadsheet timezone, using {WEEKLY_SUMMARY_TIMEZONE}: {e}")
+            if _SHEET_TIMEZONE != WEEKLY_SUMMARY_TIMEZONE:
+                logger.warning(
+                    f"Spreadsheet timezone {_SHEET_TIMEZONE} differs from WEEKLY_SUMMARY_TIMEZONE "
+                    f"{WEEKLY_SUMMARY_TIMEZONE}; the weekly summary runs at 08:00 {WEEKLY_SUMMARY_TIMEZONE}"
+                )
+            
+            return _WORKSHEET
+        except Exception as e:
+            logger.error(f"Error connecting to Google Sheets: {type(e).__name__}: {e}")
+            return None
+
+
+def sheet_now() -> datetime:
+    """Current time in the spreadsheet's timezone (WEEKLY_SUMMARY_TIMEZONE until connected)."""
+    return datetime.now(_SHEET_TIMEZONE)
+
+
+def reset_google_sheet(error: Exception) -> None:
+    """Drop the cached worksheet after API/auth errors so the next call reconnects."""
+    global _WORKSHEET
+    if isinstance(error, gspread.exceptions.APIError) and error.response.status_code in SHEETS_RETRY_STATUS_CODES:
+        return  # Rate limit or server hiccup, reconnecting wouldn't help
+    if isinstance(error, (gspread.exceptions.APIError, RefreshError)):
+        logger.warning("Resetting cached Google Sheets connection")
+        _WORKSHEET = None
+
+
+# Local mirror of the order rows, used for all reads. Writes made by the bot are
+# applied to it directly; reload_orders() picks up edits made in the sheet itself.
+SHEET_REFRESH_INTERVAL = 60  # seconds
+SHEET_CACHE_RANGE = "A2:I"  # BestellNr ... Bestellt?, without header
+SHEET_CACHE_COLUMNS = 9
+_SHEET_CACHE = {"loaded_at": None, "rows": [], "pending_by_chat_id": {}, "haystacks": []}
+_SHEET_CACHE_VERSION = 0  # Bumped on every local write, see load_sheet_cache()
+_SHEET_CACHE_LOCK = threading.Lock()
+_SHEET_LOAD_LOCK = threading.Lock()  # Only one download at a time
+
+
+def index_pending_orders(rows: list) -> dict:
+    """Map each ChatId to the indexes of its orders that are neither ordered nor cancelled yet."""
+    pending_by_chat_id = {}
+    for i, row in enumerate(rows):
+        if row[8].strip() == "":
+            pending_by_chat_id.setdefault(row[3], []).append(i)
+    
+    return pending_by_chat_id
+
+
+def search_key(row: list) -> bytes:
+    """Case-folded Mitarbeiter, Artikel and Kostenstelle of a row, as searched by /suche."""
+    return f"{row[2]}\x00{row[4]}\x00{row[7]}".casefold().encode()
+
+
+def load_sheet_cache(worksheet) -> dict:
+    """Download the order rows from the sheet into the local mirror."""
+    global _SHEET_CACHE
+    with _SHEET_CACHE_LOCK:
+        version = _SHEET_CACHE_VERSION
+    
+    rows = with_retry(worksheet.get_values, SHEET_CACHE_RANGE)
+    # gspread returns [[]] for an empty range
+    rows = fill_gaps(rows, cols=SHEET_CACHE_COLUMNS) if rows != [[]] else []
+    
+    with _SHEET_CACHE_LOCK:
+        changed = version != _SHEET_CACHE_VERSION
+        if changed and _SHEET_CACHE["loaded_at"] is not None:
+            # The bot wrote while we were downloading; keep the mirror and retry next refresh
+            return _SHEET_CACHE
+        
+        _SHEET_CACHE = {
+            # A write we may have missed leaves the mirror marked as not loaded
+            "loaded_at": None if changed else monotonic(),
+            "rows": rows,
+            "pending_by_chat_id": index_pending_orders(rows),
+            "haystacks": [search_key(row) for row in rows]
+        }
+        return _SHEET_CACHE
+
+
+def get_sheet_cache() -> dict:
+    """Return the local mirror of the order rows, loading it from the sheet if needed.
+
+    "rows" holds columns A-I without the header, so rows[i] is sheet row i + 2.
+    Every row is padded to SHEET_CACHE_COLUMNS cells, so callers can index
+    columns A-I directly. "pending_by_chat_id" maps a ChatId to the indexes of
+    that user's orders which are neither ordered nor cancelled yet.
+    "haystacks" holds search_key() of each row for search_orders().
+    """
+    cache = _SHEET_CACHE
+    if cache["loaded_at"] is not None:
+        return cache
+    
+    with _SHEET_LOAD_LOCK:
+        # Another thread may have loaded it while we were waiting
+        cache = _SHEET_CACHE
+        if cache["loaded_at"] is not None:
+            return cache
+        
         worksheet = get_google_sheet()
         if not worksheet:
-            return "#001"
+            return cache
+        
+        return load_sheet_cache(worksheet)
+
+
+def patch_sheet_cache(row_number: int, values: list, first_column: int = 0) -> None:
+    """Apply values the bot just wrote to the sheet to the local mirror.
+
+    values is a list of rows starting at sheet row row_number and column index
+    first_column, like the range passed to worksheet.update().
+    """
+    global _SHEET_CACHE, _SHEET_CACHE_VERSION
+    with _SHEET_CACHE_LOCK:
+        _SHEET_CACHE_VERSION += 1
+        if _SHEET_CACHE["loaded_at"] is None:
+            return
         
-        # Count rows (excluding header)
-        all_values = worksheet.get_all_values()
-        order_count = len(all_values)  # includes header, so this gives us next number
+        rows = list(_SHEET_CACHE["rows"])
+        haystacks = list(_SHEET_CACHE["haystacks"])
+        start = row_number - 2
+        if start > len(rows):
+            # Rows were added in the sheet that we haven't seen yet, load them on next read
+            _SHEET_CACHE["loaded_at"] = None
+            return
+        
+        for i, row_values in enumerate(values, start=start):
+            row = list(rows[i]) if i < len(rows) else [""] * SHEET_CACHE_COLUMNS
+            row[first_column:first_column + len(row_values)] = row_values
+            row = row[:SHEET_CACHE_COLUMNS]
+            if i < len(rows):
+                rows[i] = row
+                haystacks[i] = search_key(row)
+            else:
+                rows.append(row)
+                haystacks.append(search_key(row))
+        
+        _SHEET_CACHE = {
+            "loaded_at": _SHEET_CACHE["loaded_at"],
+            "rows": rows,
+            "pending_by_chat_id": index_pending_orders(rows),
+            "haystacks": haystacks
+        }
+
+
+@run_in_thread
+def refresh_sheet_cache() -> None:
+    """Reload the local mirror from the sheet."""
+    try:
+        with _SHEET_LOAD_LOCK:
+            worksheet = get_google_sheet()
+            if worksheet:
+                load_sheet_cache(worksheet)
+    except Exception as e:
+        logger.error(f"Error loading orders from sheet: {e}")
+        reset_google_sheet(e)
+
+
+async def reload_orders(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Refresh the local mirror of the sheet (repeating job)."""
+    await refresh_sheet_cache()
+
+
+# Next free order number, taken from the mirror once and then counted locally
+_NEXT_ORDER_NUMBER = None
+_ORDER_NUMBER_LOCK = threading.Lock()
+
+
+@run_in_thread
+def get_next_order_number() -> str:
+    """Reserve the next order number.
+
+    The counter is initialized from the local mirror on first use and
+    incremented locally afterwards, so saving an order doesn't read the sheet.
+    """
+    global _NEXT_ORDER_NUMBER
+    try:
+        with _ORDER_NUMBER_LOCK:
+            if _NEXT_ORDER_NUMBER is None:
+                cache = get_sheet_cache()
+                if cache["loaded_at"] is None:
+                    return "#???"
+                
+                # Rows without header + 1 gives us next number
+                _NEXT_ORDER_NUMBER = len(cache["rows"]) + 1
+            
+            order_count = _NEXT_ORDER_NUMBER
+            _NEXT_ORDER_NUMBER += 1
         
         return f"#{order_count:03d}"
     except Exception as e:
         logger.error(f"Error getting order number: {e}")
+        reset_google_sheet(e)
         return "#???"
 
 
-def save_to_sheet(data: dict) -> tuple[bool, str]:
-    """Save a procurement request to Google Sheets. Returns (success, order_number)."""
+# Orders waiting to be written to the sheet by flush_orders()
+ORDER_FLUSH_INTERVAL = 5  # seconds
+_ORDER_QUEUE = asyncio.Queue()
+_FAILED_ORDER_ROWS = []  # Rows of a failed write, retried before newer queued orders
+
+
+async def save_to_sheet(data: dict) -> tuple[bool, str]:
+    """Queue a procurement request for Google Sheets. Returns (success, order_number).
+
+    The row is written in the background by flush_orders(), so the order number
+    can be confirmed to the user right away.
+    """
+    # Get next order number
+    order_number = await get_next_order_number()
+    if order_number == "#???":
+        return False, ""
+    
+    # Prepare row data matching the columns:
+    # BestellNr | Timestamp | Mitarbeiter | ChatId | Artikel | Menge | Dringlichkeit | Kostenstelle | Bestellt? | Bestellt am | Foto-ID
+    row = [
+        order_number,
+        "",  # Timestamp, set by write_queued_orders()
+        data["mitarbeiter"],
+        str(data["chat_id"]),
+        data["artikel"],
+        data["menge"],
+        data["dringlichkeit"],
+        data["kostenstelle"],
+        "",  # Bestellt?
+        "",   # Bestellt am
+        data.get("foto_id", "")  # Column K: Foto-ID
+    ]
+    
+    await _ORDER_QUEUE.put(row)
+    logger.info(f"Queued order {order_number} from {data['mitarbeiter']}: {data['artikel']}")
+    return True, order_number
+
+
+async def write_queued_orders() -> None:
+    """Write all queued orders to Google Sheets, keeping them for the next run if that fails."""
+    # Earlier failed rows first, so the sheet stays in order number order
+    rows = list(_FAILED_ORDER_ROWS)
+    _FAILED_ORDER_ROWS.clear()
+    while not _ORDER_QUEUE.empty():
+        rows.append(_ORDER_QUEUE.get_nowait())
+    
+    if not rows:
+        return
+    
+    # All orders of one batch share a timestamp; rows kept from a failed attempt keep theirs
+    timestamp = sheet_now().strftime("%Y-%m-%d %H:%M:%S")
+    for row in rows:
+        if not row[1]:
+            row[1] = timestamp
+    
+    if await append_orders_to_sheet(rows):
+        return
+    
+    # Keep the orders for the next attempt, ahead of anything queued in the meantime
+    _FAILED_ORDER_ROWS[:0] = rows
+
+
+@run_in_thread
+def append_orders_to_sheet(rows: list) -> bool:
+    """Append order rows to Google Sheets with a single append_rows call."""
     try:
         worksheet = get_google_sheet()
         if not worksheet:
-            return False, ""
-        
-        # Get next order number
-        order_number = get_next_order_number()
-        
-        # Prepare row data matching the columns:
-        # BestellNr | Timestamp | Mitarbeiter | ChatId | Artikel | Menge | Dringlichkeit | Kostenstelle | Bestellt? | Bestellt am | Foto-ID
-        row = [
-            order_number,
-            data["timestamp"],
-            data["mitarbeiter"],
-            str(data["chat_id"]),
-            data["artikel"],
-            data["menge"],
-            data["dringlichkeit"],
-            data["kostenstelle"],
-            "",  # Bestellt?
-            "",   # Bestellt am
-            data.get("foto_id", "")  # Column K: Foto-ID
-        ]
+            return False
         
-        worksheet.append_row(row, value_input_option="USER_ENTERED")
-        logger.info(f"Saved order {order_number} from {data['mitarbeiter']}: {data['artikel']}")
-        return True, order_number
+        # Appending twice would duplicate orders, so only retry rejected (rate limited) requests
+        response = with_retry(
+            worksheet.append_rows,
+            rows,
+            value_input_option="USER_ENTERED",
+            retry_status_codes={429}
+        )
         
+        # The response tells us where the rows landed, e.g. "Sheet1!A57:K59"
+        updated_range = get_a1_from_absolute_range(response["updates"]["updatedRange"])
+        first_row = a1_range_to_grid_range(updated_range)["startRowIndex"] + 1
+        patch_sheet_cache(first_row, rows)
+        logger.info(f"Saved {len(rows)} order(s) to sheet: {', '.join(row[0] for row in rows)}")
+        return True
     except Exception as e:
         logger.error(f"Error saving to sheet: {e}")
-        return False, ""
+        reset_google_sheet(e)
+        return False
+
 
+async def flush_orders(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Write queued orders to Google Sheets (repeating job)."""
+    await write_queued_orders()
 
+
+@run_in_thread
 def get_pending_orders_for_user(chat_id: int) -> list:
     """Get all pending orders for a specific user."""
     try:
-        worksheet = get_google_sheet()
-        if not worksheet:
-            return []
-        
-        all_values = worksheet.get_all_values()
-        if len(all_values) <= 1:  # Only header or empty
-            return []
+        cache = get_sheet_cache()
+        rows = cache["rows"]
         
+        # Only look at this user's orders where 'Bestellt?' is still empty
         pending = []
-        for i, row in enumerate(all_values[1:], start=2):  # Skip header, start row counting at 2
-            if len(row) >= 9:
-                # Check if ChatId matches and not yet ordered (Bestellt? is empty)
-                row_chat_id = row[3] if len(row) > 3 else ""
-                bestellt = row[8] if len(row) > 8 else ""
-                
-                if str(chat_id) == row_chat_id and bestellt.strip() == "":
-                    pending.append({
-                        "row": i,
-                        "order_number": row[0],
-                        "timestamp": row[1],
-                        "artikel": row[4],
-                        "menge": row[5],
-                        "dringlichkeit": row[6],
-                        "kostenstelle": row[7]
-                    })
+        for i in cache["pending_by_chat_id"].get(str(chat_id), []):
+            row = rows[i]
+            pending.append({
+                "row": i + 2,  # Header is not included, sheet rows start at 2
+                "order_number": row[0],
+                "timestamp": row[1],
+                "artikel": row[4],
+                "menge": row[5],
+                "dringlichkeit": row[6],
+                "kostenstelle": row[7]
+            })
         
         return pending
     except Exception as e:
         logger.error(f"Error getting pending orders: {e}")
+        reset_google_sheet(e)
         return []
 
 
+@run_in_thread
 def get_all_pending_orders() -> list:
     """Get all orders that are not yet marked as ordered or cancelled."""
     try:
-        worksheet = get_google_sheet()
-        if not worksheet:
-            return []
-        
-        all_values = worksheet.get_all_values()
-        if len(all_values) <= 1:
+        rows = get_sheet_cache()["rows"]
+        if not rows:
             return []
         
         pending = []
-        for i, row in enumerate(all_values[1:], start=2):
-            if len(row) >= 9:
-                bestellt = row[8].strip().upper()
-                if bestellt == "":
-                    pending.append({
-                        "row": i,
-                        "order_number": row[0],
-                        "timestamp": row[1],
-                        "mitarbeiter": row[2],
-                        "artikel": row[4],
-                        "menge": row[5],
-                        "dringlichkeit": row[6],
-                        "kostenstelle": row[7]
-                    })
+        for i, row in enumerate(rows, start=2):
+            bestellt = row[8].strip().upper()
+            if bestellt == "":
+                pending.append({
+                    "row": i,
+                    "order_number": row[0],
+                    "timestamp": row[1],
+                    "mitarbeiter": row[2],
+                    "artikel": row[4],
+                    "menge": row[5],
+                    "dringlichkeit": row[6],
+                    "kostenstelle": row[7]
+                })
         
         return pending
     except Exception as e:
         logger.error(f"Error getting all pending orders: {e}")
+        reset_google_sheet(e)
         return []
 
 
-def update_order_status(row_number: int, status: str) -> bool:
-    """Update order status in column I and set timestamp in column J."""
+def write_order_status(row_number: int, status: str) -> bool:
+    """Write status to column I and the current time to column J in one request."""
     try:
         worksheet = get_google_sheet()
         if not worksheet:
             return False
-            
-        # Column I (9): Status, Column J (10): Timestamp
-        worksheet.update_cell(row_number, 9, status)
-        worksheet.update_cell(row_number, 10, datetime.now().strftime("%Y-%m-%d %H:%M"))
+        
+        # Column I (9): Status, Column J (10): Timestamp, in the sheet's own timezone
+        values = [[status, sheet_now().strftime("%Y-%m-%d %H:%M")]]
+        with_retry(
+            worksheet.update,
+            range_name=f"I{row_number}:J{row_number}",
+            values=values,
+            value_input_option="USER_ENTERED"
+        )
+        patch_sheet_cache(row_number, values, first_column=8)
         
         return True
     except Exception as e:
-        logger.error(f"Error updating order status: {e}")
+        logger.error(f"Error updating order status to {status}: {e}")
+        reset_google_sheet(e)
         return False
 
 
+@run_in_thread
+def update_order_status(row_number: int, status: str) -> bool:
+    """Update order status in column I and set timestamp in column J."""
+    return write_order_status(row_number, status)
+
+
+@run_in_thread
 def cancel_order(row_number: int) -> bool:
     """Cancel an order by marking it as 'STORNIERT'."""
-    try:
-        worksheet = get_google_sheet()
-        if not worksheet:
-            return False
-        
-        # Mark as cancelled in 'Bestellt?' column (column I = 9)
-        worksheet.update_cell(row_number, 9, "STORNIERT")
-        worksheet.update_cell(row_number, 10, datetime.now().strftime("%Y-%m-%d %H:%M"))
-        
-        return True
-    except Exception as e:
-        logger.error(f"Error cancelling order: {e}")
-        return False
+    return write_order_status(row_number, "STORNIERT")
 
 
+@run_in_thread
 def search_orders(search_term: str) -> list:
     """Search for orders by article name."""
     try:
-        worksheet = get_google_sheet()
-        if not worksheet:
-            return []
-        
-        all_values = worksheet.get_all_values()
-        if len(all_values) <= 1:
-            return []
+        cache = get_sheet_cache()
+        rows = cache["rows"]
         
+        # Compare UTF-8 bytes against the precomputed search keys
         results = []
-        search_lower = search_term.lower()
+        needle = search_term.casefold().encode()
         
-        for i, row in enumerate(all_values[1:], start=2):
-            if len(row) >= 8:
-                artikel = row[4].lower() if len(row) > 4 else ""
-                mitarbeiter = row[2].lower() if len(row) > 2 else ""
-                kostenstelle = row[7].lower() if len(row) > 7 else ""
-                
-                if search_lower in artikel or search_lower in mitarbeiter or search_lower in kostenstelle:
-                    results.append({
-                        "row": i,
-                        "order_number": row[0],
-                        "timestamp": row[1],
-                        "mitarbeiter": row[2],
-                        "artikel": row[4],
-                        "menge": row[5],
-                        "dringlichkeit": row[6],
-                        "kostenstelle": row[7],
-                        "bestellt": row[8] if len(row) > 8 else ""
-                    })
+        for i, haystack in enumerate(cache["haystacks"]):
+            if needle in haystack:
+                row = rows[i]
+                results.append({
+                    "row": i + 2,
+                    "order_number": row[0],
+                    "timestamp": row[1],
+                    "mitarbeiter": row[2],
+                    "artikel": row[4],
+                    "menge": row[5],
+                    "dringlichkeit": row[6],
+                    "kostenstelle": row[7],
+                    "bestellt": row[8]
+                })
+                if len(results) == 10:  # Limit to 10 results
+                    break
         
-        return results[:10]  # Limit to 10 results
+        return results
     except Exception as e:
         logger.error(f"Error searching orders: {e}")
+        reset_google_sheet(e)
         return []
 
 
-def get_weekly_summary() -> dict:
-    """Get order statistics for the current week."""
+@run_in_thread
+def get_weekly_summary(weeks_ago: int = 0) -> dict:
+    """Get order statistics for the current week (or an earlier one with weeks_ago)."""
     try:
-        worksheet = get_google_sheet()
-        if not worksheet:
+        cache = get_sheet_cache()
+        rows = cache["rows"]
+        if cache["loaded_at"] is None and not rows:  # Sheet not reachable
             return {}
         
-        all_values = worksheet.get_all_values()
-        if len(all_values) <= 1:
+        if not rows:
             return {"total": 0, "pending": 0, "ordered": 0, "cancelled": 0}
         
-        # Get current week's start (Monday)
-        today = datetime.now()
-        week_start = today.replace(hour=0, minute=0, second=0) - timedelta(days=today.weekday())
+        # Get the week's start (Monday) and end; timestamps are "YYYY-MM-DD HH:MM:SS",
+        # so comparing the strings gives the same order as comparing the dates
+        today = sheet_now()
+        week_start = today.replace(hour=0, minute=0, second=0) - timedelta(days=today.weekday(), weeks=weeks_ago)
+        week_start_str = week_start.strftime("%Y-%m-%d %H:%M:%S")
+        week_end_str = (week_start + timedelta(weeks=1)).strftime("%Y-%m-%d %H:%M:%S")
         
         total = 0
         pending = 0
         ordered = 0
         cancelled = 0
-        by_kostenstelle = {}
+        by_kostenstelle = Counter()
         
-        for row in all_values[1:]:
-            if len(row) >= 9:
-                try:
-                    order_date = datetime.strptime(row[1], "%Y-%m-%d %H:%M:%S")
-                    if order_date >= week_start:
-                        total += 1
-                        status = row[8].strip().upper()
-                        
-                        if status == "":
-                            pending += 1
-                        elif status == "STORNIERT":
-                            cancelled += 1
-                        else:
-                            ordered += 1
-                        
-                        ks = row[7]
-                        by_kostenstelle[ks] = by_kostenstelle.get(ks, 0) + 1
-                except:
-                    pass
+        for row in rows:
+            if week_start_str <= row[1] < week_end_str:
+                total += 1
+                status = row[8].strip().upper()
+                
+                if status == "":
+                    pending += 1
+                elif status == "STORNIERT":
+                    cancelled += 1
+                else:
+                    ordered += 1
+                
+                by_kostenstelle[row[7]] += 1
         
         return {
             "total": total,
@@ -338,6 +710,7 @@ def get_weekly_summary() -> dict:
         }
     except Exception as e:
         logger.error(f"Error getting weekly summary: {e}")
+        reset_google_sheet(e)
         return {}
 
 
@@ -386,16 +759,10 @@ async def menge(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Store the quantity and ask for urgency."""
     context.user_data["menge"] = update.message.text
     
-    reply_keyboard = DRINGLICHKEIT_OPTIONS
-    
     await update.message.reply_text(
         f"✅ Menge: *{update.message.text}*\n\n"
         f"⏰ **3/5: Dringend oder normal?**",
-        reply_markup=ReplyKeyboardMarkup(
-            reply_keyboard, 
-            one_time_keyboard=True,
-            resize_keyboard=True
-        ),
+        reply_markup=DRINGLICHKEIT_MARKUP,
         parse_mode="Markdown"
     )
     
@@ -406,16 +773,10 @@ async def dringlichkeit(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     """Store the urgency and ask for cost center."""
     context.user_data["dringlichkeit"] = update.message.text
     
-    reply_keyboard = KOSTENSTELLE_OPTIONS
-    
     await update.message.reply_text(
         f"✅ Dringlichkeit: *{update.message.text}*\n\n"
         f"💰 **4/5: Für welche Kostenstelle ist die Bestellung?**",
-        reply_markup=ReplyKeyboardMarkup(
-            reply_keyboard, 
-            one_time_keyboard=True,
-            resize_keyboard=True
-        ),
+        reply_markup=KOSTENSTELLE_MARKUP,
         parse_mode="Markdown"
     )
     
@@ -460,12 +821,6 @@ async def show_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     foto_text = "\n📸 Foto: Ja" if context.user_data.get("foto_id") else ""
     
-    keyboard = [
-        [InlineKeyboardButton("✅ Bestätigen & Absenden", callback_data="confirm_yes")],
-        [InlineKeyboardButton("✏️ Nochmal von vorne", callback_data="confirm_restart")],
-        [InlineKeyboardButton("❌ Abbrechen", callback_data="confirm_cancel")]
-    ]
-    
     await update.message.reply_text(
         f"📋 **Bestellungsübersicht:**\n\n"
         f"📦 Artikel: *{context.user_data['artikel']}*\n"
@@ -473,7 +828,7 @@ async def show_confirmation(update: Update, context: ContextTypes.DEFAULT_TYPE)
         f"⏰ Dringlichkeit: *{context.user_data['dringlichkeit']}*\n"
         f"💰 Kostenstelle: *{context.user_data['kostenstelle']}*{foto_text}\n\n"
         f"❓ **Ist alles richtig?**",
-        reply_markup=InlineKeyboardMarkup(keyboard),
+        reply_markup=CONFIRMATION_MARKUP,
         parse_mode="Markdown"
     )
     
@@ -528,7 +883,6 @@ async def save_order(update, context: ContextTypes.DEFAULT_TYPE, from_callback:
     
     # Prepare data for saving
     data = {
-        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "mitarbeiter": f"{user.first_name} {user.last_name or ''}".strip(),
         "chat_id": chat_id,
         "artikel": context.user_data["artikel"],
@@ -539,32 +893,22 @@ async def save_order(update, context: ContextTypes.DEFAULT_TYPE, from_callback:
     }
     
     # Save to Google Sheets
-    success, order_number = save_to_sheet(data)
+    success, order_number = await save_to_sheet(data)
     
     if success:
-        foto_text = "\n📸 Mit Foto" if data["foto_id"] else ""
-        await send_message(
-            f"✅ Bestellanfrage {order_number} erfasst!\n\n"
-            f"📦 Artikel: {data['artikel']}\n"
-            f"🔢 Menge: {data['menge']}\n"
-            f"⏰ Dringlichkeit: {data['dringlichkeit']}\n"
-            f"💰 Kostenstelle: {data['kostenstelle']}{foto_text}\n\n"
-            f"Du wirst benachrichtigt, wenn bestellt wurde.\n\n"
-            f"📋 /meine_bestellungen - Deine offenen Bestellungen\n"
-            f"🆕 /start - Neue Anfrage"
-        )
+        message_data = {
+            **data,
+            "order_number": order_number,
+            "foto_text": "\n📸 Mit Foto" if data["foto_id"] else ""
+        }
+        await send_message(ORDER_SAVED_TMPL.format_map(message_data))
         
         # Notify admin if configured
         if ADMIN_CHAT_ID:
             try:
                 admin_msg = await context.bot.send_message(
                     chat_id=ADMIN_CHAT_ID,
-                    text=f"🆕 Neue Bestellung {order_number}\n\n"
-                         f"👤 Von: {data['mitarbeiter']}\n"
-                         f"📦 Artikel: {data['artikel']}\n"
-                         f"🔢 Menge: {data['menge']}\n"
-                         f"⏰ Dringlichkeit: {data['dringlichkeit']}\n"
-                         f"💰 Kostenstelle: {data['kostenstelle']}"
+                    text=ADMIN_NEW_ORDER_TMPL.format_map(message_data)
                 )
                 
                 # Send photo to admin if available
@@ -572,7 +916,7 @@ async def save_order(update, context: ContextTypes.DEFAULT_TYPE, from_callback:
                     await context.bot.send_photo(
                         chat_id=ADMIN_CHAT_ID,
                         photo=data["foto_id"],
-                        caption=f"📸 Foto für Bestellung {order_number}"
+                        caption=ADMIN_NEW_ORDER_PHOTO_TMPL.format_map(message_data)
                     )
             except Exception as e:
                 logger.error(f"Could not notify admin: {e}")
@@ -604,7 +948,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def meine_bestellungen(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show user's pending orders."""
     chat_id = update.effective_chat.id
-    pending = get_pending_orders_for_user(chat_id)
+    pending = await get_pending_orders_for_user(chat_id)
     
     if not pending:
         await update.message.reply_text(
@@ -631,7 +975,7 @@ async def meine_bestellungen(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def stornieren_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the cancellation process - show pending orders."""
     chat_id = update.effective_chat.id
-    pending = get_pending_orders_for_user(chat_id)
+    pending = await get_pending_orders_for_user(chat_id)
     
     if not pending:
         await update.message.reply_text(
@@ -678,14 +1022,8 @@ async def stornieren_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
     pending = context.user_data.get("pending_orders", [])
     order = next((o for o in pending if o["row"] == row_number), None)
     
-    if order and cancel_order(row_number):
-        await query.edit_message_text(
-            f"✅ **Bestellung {order['order_number']} wurde storniert.**\n\n"
-            f"📦 {order['artikel']} x {order['menge']}\n\n"
-            f"/meine_bestellungen - Offene Bestellungen\n"
-            f"/start - Neue Bestellung",
-            parse_mode="Markdown"
-        )
+    if order and await cancel_order(row_number):
+        await query.edit_message_text(ORDER_CANCELLED_TMPL.format_map(order))
         
         # Notify admin
         if ADMIN_CHAT_ID:
@@ -693,11 +1031,7 @@ async def stornieren_callback(update: Update, context: ContextTypes.DEFAULT_TYPE
                 user = update.effective_user
                 await context.bot.send_message(
                     chat_id=ADMIN_CHAT_ID,
-                    text=f"🗑️ **Bestellung {order['order_number']} STORNIERT**\n\n"
-                         f"👤 Von: {user.first_name}\n"
-                         f"📦 Artikel: {order['artikel']}\n"
-                         f"🔢 Menge: {order['menge']}",
-                    parse_mode="Markdown"
+                    text=ADMIN_ORDER_CANCELLED_TMPL.format_map({**order, "first_name": user.first_name})
                 )
             except Exception as e:
                 logger.error(f"Could not notify admin: {e}")
@@ -736,7 +1070,7 @@ async def admin_bestellungen_command(update: Update, context: ContextTypes.DEFAU
             await update.message.reply_text(f"⛔ Nur für Admins. (Deine ID: {chat_id}, Konfiguriert: {ADMIN_CHAT_ID})")
             return
 
-        pending = get_all_pending_orders()
+        pending = await get_all_pending_orders()
         
         if not pending:
             await update.message.reply_text("📋 Es liegen aktuell keine offenen Bestellungen vor.")
@@ -813,11 +1147,11 @@ async def status_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     row_number = int(parts[1])
     new_status = parts[2]
     
-    if update_order_status(row_number, new_status):
+    if await update_order_status(row_number, new_status):
         status_text = "✅ Bestellt" if new_status == "BESTELLT" else "📦 Angekommen" if new_status == "ERHALTEN" else "❌ Storniert"
         await query.edit_message_text(
             f"{query.message.text}\n\n"
-            f"UPDATE: {status_text} am {datetime.now().strftime('%d.%m. %H:%M')}"
+            f"UPDATE: {status_text} am {sheet_now().strftime('%d.%m. %H:%M')}"
         )
     else:
         await query.message.reply_text("❌ Fehler beim Aktualisieren des Status.")
@@ -888,7 +1222,7 @@ async def suche_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
         return
     
     search_term = " ".join(context.args)
-    results = search_orders(search_term)
+    results = await search_orders(search_term)
     
     if not results:
         await update.message.reply_text(
@@ -912,7 +1246,7 @@ async def suche_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 async def statistik_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show weekly statistics."""
-    stats = get_weekly_summary()
+    stats = await get_weekly_summary()
     
     if not stats:
         await update.message.reply_text("Fehler beim Laden der Statistik.")
@@ -933,15 +1267,15 @@ async def statistik_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 
 async def send_weekly_summary(context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Send weekly summary to admin (scheduled job)."""
+    """Send last week's summary to admin (scheduled job, Monday mornings)."""
     if not ADMIN_CHAT_ID:
         return
     
-    stats = get_weekly_summary()
+    stats = await get_weekly_summary(weeks_ago=1)
     if not stats:
         return
     
-    message = "📅 **Wöchentliche Zusammenfassung**\n\n"
+    message = "📅 **Wöchentliche Zusammenfassung (Vorwoche)**\n\n"
     message += f"📦 Gesamt: {stats.get('total', 0)} Bestellungen\n"
     message += f"⏳ Offen: {stats.get('pending', 0)}\n"
     message += f"✅ Bestellt: {stats.get('ordered', 0)}\n"
@@ -992,6 +1326,22 @@ async def post_init(application: Application) -> None:
     logger.info("✅ Slash commands registered in Telegram menu.")
 
 
+async def post_shutdown(application: Application) -> None:
+    """Write orders that are still queued before the bot exits."""
+    await write_queued_orders()
+    
+    # Orders the user was already told about but that never reached the sheet
+    unsaved = list(_FAILED_ORDER_ROWS)
+    while not _ORDER_QUEUE.empty():
+        unsaved.append(_ORDER_QUEUE.get_nowait())
+    
+    for row in unsaved:
+        logger.error(
+            f"Order NOT saved to sheet, please enter manually: {row[0]} | "
+            f"Mitarbeiter: {row[2]} | Artikel: {row[4]} | Menge: {row[5]} | Kostenstelle: {row[7]}"
+        )
+
+
 def main() -> None:
     """Start the bot."""
     if not TELEGRAM_BOT_TOKEN:
@@ -999,7 +1349,33 @@ def main() -> None:
         return
     
     # Create the Application
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).post_init(post_init).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    
+    if application.job_queue is None:
+        logger.error("JobQueue not available! Install python-telegram-bot[job-queue].")
+        return
+    
+    # Load the orders into the local mirror now and keep it in sync with the sheet
+    application.job_queue.run_repeating(
+        reload_orders,
+        interval=SHEET_REFRESH_INTERVAL,
+        first=0,
+        name="reload_orders"
+    )
+    
+    # Write queued orders to Google Sheets in batches
+    application.job_queue.run_repeating(
+        flush_orders,
+        interval=ORDER_FLUSH_INTERVAL,
+        first=ORDER_FLUSH_INTERVAL,
+        name="flush_orders"
+    )
     
     # Order conversation handler
     order_conv_handler = ConversationHandler(
@@ -1054,15 +1430,30 @@ def main() -> None:
     application.add_handler(CommandHandler("hilfe", help_command))
     application.add_handler(CommandHandler("help", help_command))
     
-    # Weekly summary: Use /statistik command manually
-    # Automatic scheduling requires 24/7 hosting
+    # Weekly summary for the admin, Mondays 08:00 in WEEKLY_SUMMARY_TIMEZONE (days: 0 = Sunday)
+    application.job_queue.run_daily(
+        send_weekly_summary,
+        time=time(hour=8, minute=0, tzinfo=WEEKLY_SUMMARY_TIMEZONE),
+        days=(1,),
+        name="weekly_summary"
+    )
     
     # Start the bot
     logger.info("🚀 Bot is starting...")
     logger.info(f"⚙️ Geladene ADMIN_CHAT_ID: '{ADMIN_CHAT_ID}'")
     if ADMIN_CHAT_ID:
         logger.info(f"📢 Admin notifications enabled for chat ID: {ADMIN_CHAT_ID}")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        logger.info(f"🌐 Webhook mode: listening on port {PORT}")
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            url_path=TELEGRAM_BOT_TOKEN,
+            webhook_url=f"{WEBHOOK_URL}/{TELEGRAM_BOT_TOKEN}",
+            allowed_updates=ALLOWED_UPDATES
+        )
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 
 if __name__ == "__main__":